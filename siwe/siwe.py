@@ -1,44 +1,185 @@
-import secrets
+import random
+import re
 import string
-from datetime import datetime
-from typing import List, Optional, Union
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import TYPE_CHECKING, List, Optional, Union
+from urllib.parse import urlsplit
 
-import eth_account.messages
-import eth_keys
-import eth_utils
-import rfc3987
 from dateutil.parser import isoparse
 from dateutil.tz import UTC
-from web3 import HTTPProvider, Web3
+from eth_hash.auto import keccak
 
 from .parsed import ABNFParsedMessage, RegExpParsedMessage
 
+if TYPE_CHECKING:
+    from eth_account.messages import SignableMessage
+    from web3 import HTTPProvider
+
+try:
+    from ciso8601 import parse_datetime as _fast_iso
+except ImportError:
+    _fast_iso = None
+
+# Approximation of an RFC 3986 URI: a scheme followed by characters RFC 3986 allows (unreserved, reserved and
+# percent-encoded octets), possibly none. Shared by the `uri` field and every entry of `resources`, and used with
+# `fullmatch` so a trailing newline is not accepted.
+_URI_RE = re.compile(
+    r"[A-Za-z][A-Za-z0-9+.\-]*:(?:[A-Za-z0-9\-._~:/?#\[\]@!$&'()*+,;=]|%[0-9A-Fa-f]{2})*"
+)
+# Used with `fullmatch`, as `$` would also accept a trailing newline that then gets hashed into the checksum.
+_ADDR_SHAPE = re.compile(r"0x[0-9a-fA-F]{40}")
+
+
+def _parse_iso(value: str) -> datetime:
+    """
+    Parse an ISO 8601 datetime string, preferring `ciso8601` when installed (the `fast` extra), then the C-backed
+    `datetime.fromisoformat`, and falling back to `dateutil` for the forms it does not accept on older Python versions.
+    """
+    if _fast_iso is not None:
+        try:
+            return _fast_iso(value)
+        except ValueError:
+            pass
+    if value[-1:] in ("Z", "z"):
+        value = value[:-1] + "+00:00"
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return isoparse(value)
+
+
+@lru_cache(maxsize=4096)
+def _is_checksum_address(value: str) -> bool:
+    """
+    Cached EIP-55 check, so repeated sign-ins from the same address skip the Keccak-256 hash. Expects `value` to
+    already match `_ADDR_SHAPE`, and stops at the first character whose case disagrees with the hash.
+    """
+    digits = value[2:]
+    digest = keccak(digits.lower().encode("ascii"))
+    for i, char in enumerate(digits):
+        if char.isdigit():
+            continue
+        nibble = digest[i // 2] >> 4 if i % 2 == 0 else digest[i // 2] & 0xF
+        if char.isupper() != (nibble >= 8):
+            return False
+    return True
+
+
+def _is_uri(value: str) -> bool:
+    """
+    Check that `value` is an RFC 3986 URI, i.e. it has a scheme and the rest of it splits cleanly.
+    """
+    if not _URI_RE.fullmatch(value):
+        return False
+    try:
+        urlsplit(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _identity(value):
+    return value
+
+
+def _coerce_int(value) -> int:
+    if isinstance(value, int):
+        return value
+    # Parsed messages carry the chain ID as a decimal string; an explicit base skips prefix detection.
+    return int(value, 10) if isinstance(value, str) else int(value)
+
+
+def _check_nonempty(value: str) -> str:
+    if value == "":
+        raise ValueError("Message `domain` must not be empty")
+    return value
+
+
+def _check_eip55(value: str) -> str:
+    if (
+        not isinstance(value, str)
+        or not _ADDR_SHAPE.fullmatch(value)
+        or not _is_checksum_address(value)
+    ):
+        raise ValueError("Message `address` must be in EIP-55 format")
+    return value
+
+
+def _validate_uri(value: str) -> str:
+    if not _is_uri(value):
+        raise ValueError("Invalid format for field `uri`")
+    return value
+
+
+def _validate_resources(value: List[str]) -> List[str]:
+    for index, url in enumerate(value):
+        if not _is_uri(url):
+            raise ValueError(f"Invalid format for field `resources` at index {index}")
+    return value
+
+
+# Per-field validators applied to the values of a message that are not None, returning the value to store.
+_VALIDATORS = {
+    "chain_id": _coerce_int,
+    "domain": _check_nonempty,
+    "address": _check_eip55,
+    "uri": _validate_uri,
+    "resources": _validate_resources,
+}
+
+# Datetime fields, and the slot caching them as a `(source string, parsed datetime)` pair. The source string is kept
+# so that a field reassigned after construction is reparsed rather than served from a stale cache.
+_DATETIME_FIELDS = {
+    "issued_at": "_issued_at_dt",
+    "expiration_time": "_expiration_time_dt",
+    "not_before": "_not_before_dt",
+}
+
+
+def _encode_defunct(text: str) -> "SignableMessage":
+    """
+    Equivalent of `eth_account.messages.encode_defunct(text=...)` for an EIP-4361 message, framing the encoded text
+    directly instead of going through its generic primitive/hex/text handling.
+    """
+    from eth_account.messages import SignableMessage
+
+    body = text.encode("utf-8")
+    return SignableMessage(
+        version=b"E",
+        # EIP-191 version 0x45 ("E"), hence the header carrying the rest of "Ethereum".
+        header=b"thereum Signed Message:\n" + str(len(body)).encode("ascii"),
+        body=body,
+    )
+
 
 class VerificationError(Exception):
-    pass
+    __slots__ = ()
 
 
 class InvalidSignature(VerificationError):
-    pass
+    __slots__ = ()
 
 
 class ExpiredMessage(VerificationError):
-    pass
+    __slots__ = ()
 
 
 class NotYetValidMessage(VerificationError):
-    pass
+    __slots__ = ()
 
 
 class DomainMismatch(VerificationError):
-    pass
+    __slots__ = ()
 
 
 class NonceMismatch(VerificationError):
-    pass
+    __slots__ = ()
 
 
 class MalformedSession(VerificationError):
+    __slots__ = ("missing_fields",)
+
     def __init__(self, missing_fields):
         self.missing_fields = missing_fields
 
@@ -106,6 +247,9 @@ class SiweMessage:
         "request_id",
         "resources",
         "_require_address",
+        "_issued_at_dt",
+        "_expiration_time_dt",
+        "_not_before_dt",
     )
 
     def __init__(
@@ -121,38 +265,47 @@ class SiweMessage:
             message_dict = message
         else:
             raise TypeError
-        for key in self.__slots__:
-            value = message_dict.get(key)
-
-            if key == "chain_id" and value is not None and type(value) is not int:
-                value = int(value)
-            elif key == "issued_at" and value is not None:
-                isoparse(value)
-            elif key == "expiration_time" and value is not None:
-                isoparse(value)
-            elif key == "not_before" and value is not None:
-                isoparse(value)
-            elif key == "domain" and value == "":
-                raise ValueError("Message `domain` must not be empty")
-            elif key == "address" and value is not None:
-                if not eth_utils.is_checksum_formatted_address(value):
-                    raise ValueError("Message `address` must be in EIP-55 format")
-            elif key == "uri" and value is not None:
-                try:
-                    rfc3987.parse(value, rule="URI")
-                except ValueError:
-                    raise ValueError("Invalid format for field `uri`")
-            elif key == "resources" and value is not None:
-                for url in value:
-                    try:
-                        rfc3987.parse(url, rule="URI")
-                    except ValueError:
-                        raise ValueError("Invalid format for field `resources`")
-
-            setattr(self, key, value)
+        self._issued_at_dt = None
+        self._expiration_time_dt = None
+        self._not_before_dt = None
+        get = message_dict.get
+        for key, slot in _FIELD_SLOTS:
+            value = get(key)
+            if value is not None:
+                if key in _DATETIME_FIELDS:
+                    setattr(self, _DATETIME_FIELDS[key], (value, _parse_iso(value)))
+                else:
+                    value = _VALIDATORS.get(key, _identity)(value)
+            slot.__set__(self, value)
 
         self._require_address = require_address
 
+    @classmethod
+    def from_prevalidated(
+        cls, data: dict, require_address: bool = True
+    ) -> "SiweMessage":
+        """
+        Rebuild a SiweMessage from fields that were already validated, e.g. a stored session, skipping the URI,
+        EIP-55 and other field checks done by the constructor. DO NOT CALL with untrusted input.
+
+        The datetime fields are still parsed, as verify() relies on their parsed values for the expiry checks.
+
+        :param data: Message fields, keyed like the attributes of this class.
+        :param require_address: Whether verify() should require the message to have an address.
+        :return: SiweMessage holding the given fields as-is.
+        """
+        obj = cls.__new__(cls)
+        get = data.get
+        for key, slot in _FIELD_SLOTS:
+            slot.__set__(obj, get(key))
+        for key, cache in _DATETIME_FIELDS.items():
+            value = get(key)
+            setattr(
+                obj, cache, (value, _parse_iso(value)) if value is not None else None
+            )
+        obj._require_address = require_address
+        return obj
+
     def prepare_message(self) -> str:
         """
         Retrieve an EIP-4361 formatted message for signature. It is recommended to instead use
@@ -161,64 +314,60 @@ class SiweMessage:
 
         :return: EIP-4361 formatted message, ready for EIP-191 signing.
         """
-        header = f"{self.domain} wants you to sign in with your Ethereum account:"
-
-        uri_field = f"URI: {self.uri}"
-
-        prefix = "\n".join([header, self.address or ""])
-
-        version_field = f"Version: {self.version}"
-
         if self.nonce is None:
             self.nonce = generate_nonce()
 
-        chain_field = f"Chain ID: {self.chain_id or 1}"
-
-        nonce_field = f"Nonce: {self.nonce}"
-
-        suffix_array = [uri_field, version_field, chain_field, nonce_field]
-
         if self.issued_at is None:
-            # TODO: Should we default to UTC or settle for local time? UX may be better for local
-            self.issued_at = datetime.now().astimezone().isoformat()
-
-        issued_at_field = f"Issued At: {self.issued_at}"
-        suffix_array.append(issued_at_field)
-
-        if self.expiration_time:
-            expiration_time_field = f"Expiration Time: {self.expiration_time}"
-            suffix_array.append(expiration_time_field)
-
-        if self.not_before:
-            not_before_field = f"Not Before: {self.not_before}"
-            suffix_array.append(not_before_field)
-
-        if self.request_id:
-            request_id_field = f"Request ID: {self.request_id}"
-            suffix_array.append(request_id_field)
-
-        if self.resources:
-            resources_field = "\n".join(
-                ["Resources:"] + [f"- {resource}" for resource in self.resources]
+            # Truncated to the millisecond precision it is formatted with, so the cached value matches the string.
+            issued_at = datetime.now(timezone.utc)
+            issued_at = issued_at.replace(
+                microsecond=issued_at.microsecond // 1000 * 1000
             )
-            suffix_array.append(resources_field)
+            self.issued_at = issued_at.isoformat(timespec="milliseconds")
+            self._issued_at_dt = (self.issued_at, issued_at)
 
-        suffix = "\n".join(suffix_array)
+        return (
+            f"{self.domain} wants you to sign in with your Ethereum account:\n"
+            f"{self.address or ''}\n"
+            + (f"\n{self.statement}\n" if self.statement else "\n")
+            + f"\nURI: {self.uri}"
+            f"\nVersion: {self.version}"
+            f"\nChain ID: {self.chain_id or 1}"
+            f"\nNonce: {self.nonce}"
+            f"\nIssued At: {self.issued_at}"
+            + (
+                f"\nExpiration Time: {self.expiration_time}"
+                if self.expiration_time
+                else ""
+            )
+            + (f"\nNot Before: {self.not_before}" if self.not_before else "")
+            + (f"\nRequest ID: {self.request_id}" if self.request_id else "")
+            + (
+                "\nResources:\n- " + "\n- ".join(self.resources)
+                if self.resources
+                else ""
+            )
+        )
 
-        if self.statement:
-            prefix = "\n\n".join([prefix, self.statement])
-        else:
-            prefix += "\n"
+    def _get_datetime(self, key: str) -> Optional[datetime]:
+        value = getattr(self, key)
+        if value is None:
+            return None
+        cache = _DATETIME_FIELDS[key]
+        cached = getattr(self, cache)
+        if cached is None or cached[0] != value:
+            cached = (value, _parse_iso(value))
+            setattr(self, cache, cached)
+        return cached[1]
 
-        return "\n\n".join([prefix, suffix])
+    def get_issued_at(self) -> Optional[datetime]:
+        return self._get_datetime("issued_at")
 
     def get_expiration_time(self) -> Optional[datetime]:
-        return (
-            isoparse(self.expiration_time) if self.expiration_time is not None else None
-        )
+        return self._get_datetime("expiration_time")
 
     def get_not_before(self) -> Optional[datetime]:
-        return isoparse(self.not_before) if self.not_before is not None else None
+        return self._get_datetime("not_before")
 
     def verify(
         self,
@@ -227,7 +376,7 @@ class SiweMessage:
         domain: Optional[str] = None,
         nonce: Optional[str] = None,
         timestamp: Optional[datetime] = None,
-        provider: Optional[HTTPProvider] = None,
+        provider: Optional["HTTPProvider"] = None,
     ) -> str:
         """
         Verifies the integrity of fields of this SiweMessage object by matching its signature.
@@ -241,13 +390,7 @@ class SiweMessage:
         Contract Wallets that implement EIP-1271 is needed.
         :return: address of the signer
         """
-        message = eth_account.messages.encode_defunct(text=self.prepare_message())
-        w3 = Web3(provider=provider)
-
         missing = []
-        if message is None:
-            missing.append("message")
-
         if self._require_address and self.address is None:
             missing.append("address")
 
@@ -270,8 +413,19 @@ class SiweMessage:
         if not_before is not None and verification_time <= not_before:
             raise NotYetValidMessage
 
+        # Deferred so that constructing and formatting messages does not pay for importing the signing stack, eth_utils
+        # included.
+        import eth_keys
+        import eth_utils
+        from eth_account import Account
+
+        # `_hash_eip191_message` is semi-private, hence eth-account being pinned to a minor version.
+        from eth_account.messages import _hash_eip191_message
+
+        # Only build and hash the message once all the cheap scalar checks have passed.
+        message_hash = _hash_eip191_message(_encode_defunct(self.prepare_message()))
         try:
-            address = w3.eth.account.recover_message(message, signature=signature)
+            address = Account._recover_hash(message_hash, signature=signature)
         except (eth_utils.exceptions.ValidationError, eth_keys.exceptions.BadSignature):
             raise InvalidSignature
 
@@ -283,7 +437,15 @@ class SiweMessage:
         return address
 
 
-def check_contract_wallet_signature(message: SiweMessage, *, provider: HTTPProvider):
+# Slot descriptors of the public message fields, so that __init__ can set them without a `setattr` lookup each.
+_FIELD_SLOTS = tuple(
+    (key, SiweMessage.__dict__[key])
+    for key in SiweMessage.__slots__
+    if not key.startswith("_")
+)
+
+
+def check_contract_wallet_signature(message: SiweMessage, *, provider: "HTTPProvider"):
     """
     Calls the EIP-1271 method for Smart Contract wallets,
 
@@ -298,6 +460,9 @@ def check_contract_wallet_signature(message: SiweMessage, *, provider: HTTPProvi
 
 alphanumerics = string.ascii_letters + string.digits
 
+# Backed by os.urandom, like `secrets`, but `choices` draws all the characters in one call.
+_SYSRAND = random.SystemRandom()
+
 
 def generate_nonce() -> str:
-    return "".join(secrets.choice(alphanumerics) for _ in range(11))
+    return "".join(_SYSRAND.choices(alphanumerics, k=11))
@@ -1,11 +1,19 @@
 import pytest
 import json
+import re
 from humps import decamelize
 from eth_account import Account, messages
+from datetime import datetime, timedelta, timezone
 from dateutil.parser import isoparse
 
 
-from siwe.siwe import SiweMessage, VerificationError
+import siwe.siwe
+from siwe.siwe import (
+    ExpiredMessage,
+    NotYetValidMessage,
+    SiweMessage,
+    VerificationError,
+)
 
 BASE_TESTS = "tests/siwe/test/"
 with open(BASE_TESTS + "parsing_positive.json", "r") as f:
@@ -17,6 +25,9 @@ with open(BASE_TESTS + "verification_negative.json", "r") as f:
 with open(BASE_TESTS + "verification_positive.json", "r") as f:
     verification_positive = decamelize(json.load(fp=f))
 
+# Fields of a valid message, for tests that only vary one of them.
+base_fields = next(iter(parsing_positive.values()))["fields"]
+
 
 class TestMessageParsing:
     @pytest.mark.parametrize("abnf", [True, False])
@@ -38,6 +49,124 @@ class TestMessageParsing:
         with pytest.raises(ValueError):
             SiweMessage(message=test, abnf=abnf)
 
+    @pytest.mark.parametrize(
+        "address",
+        [
+            # All letters lowercase, which is what the EIP-55 checksum asks for here.
+            "0x20b282a85214e64527cf1606a843483360b881d2",
+            # No letters, so there is no casing to check.
+            "0x1234567890123456789012345678901234567890",
+        ],
+    )
+    def test_valid_address(self, address):
+        fields = dict(base_fields, address=address)
+        assert SiweMessage(message=fields).address == address
+
+    @pytest.mark.parametrize(
+        "address",
+        [
+            # Mixed case, but the first `A` of a valid checksum lowercased.
+            "0xe5a12547fe4E872D192E3eCecb76F2Ce1aeA4946",
+            # Casing chosen to match the hash of the address followed by `\n`.
+            "0x3eEa870f3595eE7dbb7D08426348CAD101c89897\n",
+            # Not a string at all.
+            0xE5A12547FE4E872D192E3ECECB76F2CE1AEA4946,
+        ],
+    )
+    def test_invalid_address(self, address):
+        fields = dict(base_fields, address=address)
+        with pytest.raises(ValueError):
+            SiweMessage(message=fields)
+
+    @pytest.mark.parametrize("field", ["uri", "resources"])
+    @pytest.mark.parametrize(
+        "uri",
+        [
+            "https://example.com/path?query=1#fragment",
+            "ipfs://Qme7ss3ARVgxv6rXqVPiikMJ8u2NLgmgszg13pYrDKEoiu",
+            "urn:isbn:0451450523",
+            "did:pkh:eip155:1:0xe5A12547fe4E872D192E3eCecb76F2Ce1aeA4946",
+            "http://[::1]:8080/",
+            "https://example.com/a%20b",
+            "foo:",
+        ],
+    )
+    def test_valid_uri(self, field, uri):
+        value = [uri] if field == "resources" else uri
+        fields = dict(base_fields, **{field: value})
+        assert getattr(SiweMessage(message=fields), field) == value
+
+    @pytest.mark.parametrize("field", ["uri", "resources"])
+    @pytest.mark.parametrize(
+        "uri",
+        [
+            "example.com",
+            "1http://example.com",
+            "https://example.com/a b",
+            "https://example.com\n",
+            "https://example.com/<script>",
+            "https://example.com/{id}",
+            "https://example.com/%zz",
+            "http://[::1",
+        ],
+    )
+    def test_invalid_uri(self, field, uri):
+        value = [uri] if field == "resources" else uri
+        fields = dict(base_fields, **{field: value})
+        with pytest.raises(ValueError, match=f"Invalid format for field `{field}`"):
+            SiweMessage(message=fields)
+
+    def test_invalid_resource_index(self):
+        fields = dict(
+            base_fields,
+            resources=["https://example.com/a", "urn:b", "not a uri"],
+        )
+        with pytest.raises(
+            ValueError, match="^Invalid format for field `resources` at index 2$"
+        ):
+            SiweMessage(message=fields)
+
+
+class TestDatetimeParsing:
+    expected = datetime(2021, 9, 30, 16, 25, 24, tzinfo=timezone.utc)
+
+    def test_fast_parser_preferred(self, monkeypatch):
+        calls = []
+
+        def fast_iso(value):
+            calls.append(value)
+            return self.expected
+
+        monkeypatch.setattr(siwe.siwe, "_fast_iso", fast_iso)
+        assert siwe.siwe._parse_iso("2021-09-30T16:25:24Z") == self.expected
+        assert calls == ["2021-09-30T16:25:24Z"]
+
+    @pytest.mark.parametrize("value", ["2021-09-30T16:25:24Z", "2021-09-30t16:25:24z"])
+    def test_fast_parser_failure_falls_back(self, monkeypatch, value):
+        def fast_iso(value):
+            raise ValueError
+
+        monkeypatch.setattr(siwe.siwe, "_fast_iso", fast_iso)
+        assert siwe.siwe._parse_iso(value) == self.expected
+
+    @pytest.mark.parametrize(
+        "value",
+        [
+            "2021-09-30T16:25:24Z",
+            "2021-09-30T16:25:24.000Z",
+            "2021-09-30T18:25:24+02:00",
+            "2021-09-30t16:25:24z",
+        ],
+    )
+    def test_without_fast_parser(self, monkeypatch, value):
+        monkeypatch.setattr(siwe.siwe, "_fast_iso", None)
+        assert siwe.siwe._parse_iso(value) == self.expected
+
+    def test_ciso8601(self):
+        ciso8601 = pytest.importorskip("ciso8601")
+        assert siwe.siwe._fast_iso is ciso8601.parse_datetime
+        assert siwe.siwe._parse_iso("2021-09-30T16:25:24.000Z") == self.expected
+
 
 class TestMessageGeneration:
     @pytest.mark.parametrize(
@@ -48,6 +177,35 @@ class TestMessageGeneration:
         siwe_message = SiweMessage(message=test["fields"])
         assert siwe_message.prepare_message() == test["message"]
 
+    @pytest.mark.parametrize(
+        "test_name,test",
+        [(test_name, test) for test_name, test in parsing_positive.items()],
+    )
+    def test_prevalidated_message(self, test_name, test):
+        siwe_message = SiweMessage.from_prevalidated(test["fields"])
+        assert siwe_message.prepare_message() == test["message"]
+
+    def test_default_issued_at(self):
+        fields = dict(base_fields)
+        del fields["issued_at"]
+        siwe_message = SiweMessage(message=fields)
+        before = datetime.now(timezone.utc)
+        message = siwe_message.prepare_message()
+        after = datetime.now(timezone.utc)
+
+        assert re.fullmatch(
+            r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d{3}\+00:00",
+            siwe_message.issued_at,
+        )
+        assert f"\nIssued At: {siwe_message.issued_at}" in message
+        issued_at = siwe_message.get_issued_at()
+        assert issued_at == isoparse(siwe_message.issued_at)
+        assert issued_at.utcoffset() == timedelta(0)
+        assert (
+            before.replace(microsecond=before.microsecond // 1000 * 1000) <= issued_at
+        )
+        assert issued_at <= after
+
 
 class TestMessageVerification:
     @pytest.mark.parametrize(
@@ -76,6 +234,15 @@ class TestMessageVerification:
                 timestamp=timestamp,
             )
 
+    @pytest.mark.parametrize(
+        "test_name,test",
+        [(test_name, test) for test_name, test in verification_positive.items()],
+    )
+    def test_valid_prevalidated_message(self, test_name, test):
+        siwe_message = SiweMessage.from_prevalidated(test)
+        timestamp = isoparse(test["time"]) if "time" in test else None
+        siwe_message.verify(test["signature"], timestamp=timestamp)
+
 
 class TestMessageRoundTrip:
     account = Account.create()
@@ -91,3 +258,30 @@ class TestMessageRoundTrip:
             messages.encode_defunct(text=message.prepare_message())
         ).signature
         message.verify(signature)
+
+    @pytest.mark.parametrize("build", ["rehydrated", "reassigned"])
+    @pytest.mark.parametrize(
+        "field,value,error",
+        [
+            ("expiration_time", "2020-01-01T00:00:00Z", ExpiredMessage),
+            ("not_before", "2100-01-01T00:00:00Z", NotYetValidMessage),
+        ],
+    )
+    def test_message_time_bounds(self, build, field, value, error):
+        fields = dict(
+            base_fields,
+            address=self.account.address,
+            expiration_time=None,
+            not_before=None,
+        )
+        if build == "rehydrated":
+            message = SiweMessage.from_prevalidated(dict(fields, **{field: value}))
+        else:
+            # Set after construction, so verify() must not rely on what __init__ parsed.
+            message = SiweMessage(fields)
+            setattr(message, field, value)
+        signature = self.account.sign_message(
+            messages.encode_defunct(text=message.prepare_message())
+        ).signature
+        with pytest.raises(error):
+            message.verify(signature)